@@ -0,0 +1,194 @@
+"""
+A load-testing harness for the OmniSci server extension.
+
+This starts a Tornado app with the extension loaded, a fake session manager,
+and a fake renderer standing in for the OmniSci server. It then drives many
+concurrent clients against the extension's endpoints, and reports the
+throughput and p50/p95/p99 latency of each endpoint.
+
+Usage:
+
+    python benchmarks/load_server_extension.py --clients 200 --requests 20
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import time
+
+from tornado import httpclient, httpserver, web
+from tornado.testing import bind_unused_port
+from traitlets.config import Config
+
+from jupyterlab_omnisci.serverextension import load_jupyter_server_extension
+from jupyterlab_omnisci.serverextension.render import BaseOmniSciRenderer
+from jupyterlab_omnisci.serverextension.session import BaseOmniSciSessionManager
+
+# A tiny valid PNG, returned by the fake renderer.
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+class FakeSessionManager(BaseOmniSciSessionManager):
+    """
+    A session manager returning fixed session data, without touching disk.
+    """
+
+    def get_session(self):
+        return {
+            "session": "fake-session",
+            "connection": {"protocol": "http", "host": "localhost", "port": "6278"},
+            "environment": {},
+            "query": "",
+        }
+
+
+class FakeRenderer(BaseOmniSciRenderer):
+    """
+    A renderer standing in for the OmniSci server, which takes
+    a fixed amount of time to render any spec.
+    """
+
+    # Counted on the class, since the configured instance may be copied.
+    renders = 0
+
+    def __init__(self, latency, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    def render(self, vega, connection, session):
+        time.sleep(self.latency)
+        FakeRenderer.renders += 1
+        return PNG
+
+
+class FakeServerApp:
+    """
+    The parts of a NotebookApp used by `load_jupyter_server_extension`.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.web_app = web.Application(base_url="/", config=config)
+
+
+def percentile(values, p):
+    """
+    The nearest-rank percentile of a sorted list of values.
+    """
+    if not values:
+        return float("nan")
+    index = max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def run_client(client, base_url, args, latencies, errors, client_id):
+    """
+    Make `args.requests` requests, cycling through the endpoints.
+    """
+    for i in range(args.requests):
+        endpoint = args.endpoints[i % len(args.endpoints)]
+        spec_id = (client_id + i) % args.distinct_specs
+        body = json.dumps(
+            {
+                "vega": {"data": [{"name": "t", "sql": f"SELECT {spec_id}"}]},
+                "connection": {"host": "localhost", "database": "omnisci"},
+                "sessionId": "fake-session",
+            }
+        )
+        if endpoint == "session":
+            request = httpclient.HTTPRequest(f"{base_url}omnisci/session")
+        else:
+            request = httpclient.HTTPRequest(
+                f"{base_url}omnisci/render", method="POST", body=body
+            )
+        start = time.perf_counter()
+        try:
+            if endpoint == "image":
+                # Render first, untimed, so that there is an image to fetch.
+                response = await client.fetch(
+                    f"{base_url}omnisci/render", method="POST", body=body
+                )
+                key = json.loads(response.body)["id"]
+                request = httpclient.HTTPRequest(f"{base_url}omnisci/render/{key}")
+                start = time.perf_counter()
+            await client.fetch(request)
+        except Exception:
+            errors[endpoint] += 1
+        else:
+            latencies[endpoint].append(time.perf_counter() - start)
+
+
+async def main(args):
+    config = Config()
+    config.OmniSciConfig.omnisci_session_manager = FakeSessionManager()
+    config.OmniSciConfig.omnisci_renderer = FakeRenderer(args.latency / 1000)
+    app = FakeServerApp(config)
+    load_jupyter_server_extension(app)
+
+    sock, port = bind_unused_port()
+    server = httpserver.HTTPServer(app.web_app)
+    server.add_sockets([sock])
+    base_url = f"http://127.0.0.1:{port}/"
+
+    client = httpclient.AsyncHTTPClient(force_instance=True, max_clients=args.clients)
+    latencies = collections.defaultdict(list)
+    errors = collections.Counter()
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            run_client(client, base_url, args, latencies, errors, i)
+            for i in range(args.clients)
+        )
+    )
+    elapsed = time.perf_counter() - start
+    client.close()
+    server.stop()
+
+    print(
+        f"{args.clients} clients x {args.requests} requests in {elapsed:.2f}s, "
+        f"{FakeRenderer.renders} renders"
+    )
+    print(
+        f"{'endpoint':<10}{'requests':>10}{'errors':>8}{'req/s':>10}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    )
+    for endpoint in args.endpoints:
+        values = sorted(latencies[endpoint])
+        p50, p95, p99 = (percentile(values, p) * 1000 for p in (50, 95, 99))
+        print(
+            f"{endpoint:<10}{len(values):>10}{errors[endpoint]:>8}"
+            f"{len(values) / elapsed:>10.1f}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--clients", type=int, default=100, help="Number of concurrent clients"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=10, help="Number of requests per client"
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=50,
+        help="Time in milliseconds the fake OmniSci server takes to render",
+    )
+    parser.add_argument(
+        "--distinct-specs",
+        type=int,
+        default=20,
+        help="Number of distinct Vega specs to render, controlling the cache hit rate",
+    )
+    parser.add_argument(
+        "--endpoints",
+        type=lambda s: s.split(","),
+        default=["session", "render", "image"],
+        help="Comma separated endpoints to drive: session, render, image",
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -4,27 +4,68 @@ This file enables using Ibis expressions inside Altair charts.
 To use it, import it and enable the `ibis` renderer and `ibis` data transformer,
 then pass an Ibis expression directly to `altair.Chart`.
 """
+import collections
+import concurrent.futures
+import contextvars
+import hashlib
+import html
+import itertools
+import json
+import logging
+import os
 import pprint
-from copy import copy
+import tempfile
+import threading
+import time
+from copy import deepcopy
 import typing
 
 import ibis
 import ibis.client
+import ibis.expr.datatypes as dt
+import ibis.expr.operations as ops
+import ibis.expr.rules as rlz
 import ipywidgets
+from ibis.expr.signature import Argument as Arg
 
 import altair
 import pandas
 from altair.vegalite.v3.display import default_renderer
 
-__all__ = ["display_chart", "interactive_chart", "get_display"]
+__all__ = [
+    "display_chart",
+    "interactive_chart",
+    "get_display",
+    "render_dashboard",
+    "QueryBudgetError",
+]
 
 import ipykernel.comm
 from IPython.display import JSON, DisplayObject, display, Code, HTML, DisplayHandle
 
 
+logger = logging.getLogger(__name__)
+
 # Data transformer to use in ibis renderer
 DEFAULT_TRANSFORMER = altair.utils.data.to_json
 
+# Global time budget in seconds for each chart's queries, used when the renderer
+# is not given a `timeout`. None means no limit.
+QUERY_TIMEOUT: typing.Optional[float] = None
+
+# Global maximum number of result rows for each chart, used when the renderer
+# is not given `max_rows`. None means no limit.
+QUERY_MAX_ROWS: typing.Optional[int] = None
+
+# Number of rows to serialize at a time when writing chunked JSON
+JSON_CHUNK_SIZE = 10000
+
+# Maximum number of compiled queries to memoize
+COMPILED_QUERY_CACHE_SIZE = 128
+
+# Maximum number of queries a dashboard runs at the same time
+DASHBOARD_MAX_WORKERS = 8
+
 
 # A placeholder vega spec that will be replaced once the
 # transform has been completed and returned via the comm channel.
@@ -34,14 +75,46 @@ EMPTY_SPEC = {"data": {"values": []}, "mark": "bar"}
 # and frontend vega-lite transforms.
 COMM_ID = "extract-vega-lite"
 
+# A comm id used to extract the transforms of many vega-lite specs at once.
+BATCH_COMM_ID = "extract-vega-lite-batch"
 
-# Set this to the active output when we are rendering with ipywidgets.
+
+# Set to the active output when we are rendering with ipywidgets.
 # We use this to get the output into the renderer, without having to pass it in explicitly.
-ACTIVE_OUTPUT: typing.Optional[ipywidgets.Output] = None
-DISPLAY_HANDLE: typing.Optional[display] = None
+# These are context-local, so that concurrent renders each land in their own output.
+ACTIVE_OUTPUT = contextvars.ContextVar("ACTIVE_OUTPUT", default=None)
+
+
+class DisplayRequest:
+    """
+    A request to render a chart into an updatable display handle.
+
+    `handle` starts as either `True` (create a new display) or an existing
+    `DisplayHandle` to update, and is a `DisplayHandle` once rendering has started.
+    """
 
+    def __init__(self, handle=True):
+        self.handle = handle
 
-def ibis_renderer(spec, type="vl", extract=True, compile=True, **options):
+
+# Set to the active display request when we are rendering with `get_display`.
+DISPLAY_REQUEST = contextvars.ContextVar("DISPLAY_REQUEST", default=None)
+
+
+def ibis_renderer(
+    spec,
+    type="vl",
+    extract=True,
+    compile=True,
+    approximate=False,
+    sample=None,
+    timeout=None,
+    max_rows=None,
+    on_budget_exceeded="refuse",
+    chunked_json=False,
+    chunk_size=None,
+    **options,
+):
     """
     Altair renderer for Ibis expressions.
 
@@ -57,83 +130,93 @@ def ibis_renderer(spec, type="vl", extract=True, compile=True, **options):
                  this cell becomes asyncronous, because it has to query the frontend through a comm for the
                  updated spec.
         compile: Whether to take the list of transformations on the spec and compile them to Ibis.
+        approximate: Whether to trade exactness for speed, by compiling aggregates to approximate
+                     equivalents (`distinct` to `approx_count_distinct`, and `median`, `q1` and `q3`
+                     to `APPROX_PERCENTILE`). The chart is marked as approximate.
+        sample: When approximate and compiling, the fraction of rows of each source table to sample.
+                Counts and sums are scaled back up by the inverse of this fraction. Views whose
+                counts or sums are left for Vega Lite to compute are not sampled.
+        timeout: The time budget in seconds for each chart's queries when type is 'vl'.
+                 If it is exceeded, the query is interrupted and an error is displayed.
+                 Defaults to `QUERY_TIMEOUT`.
+        max_rows: The maximum number of result rows for each chart when type is 'vl'.
+                  The query is limited to one more row than this, to tell if it was exceeded.
+                  This bounds only the size of the result, not the work the query does:
+                  an aggregate still scans its whole table, so use `timeout` to bound that.
+                  Defaults to `QUERY_MAX_ROWS`.
+        on_budget_exceeded: What to do if a chart would return more than `max_rows` rows:
+            'refuse': Display an error instead of the chart.
+            'limit': Display the first `max_rows` rows.
+        chunked_json: Whether to write results to the JSON data file in chunks of rows when type
+                      is 'vl', rather than building the JSON for the whole result as one string first.
+                      This only bounds the memory used for the JSON: results are not streamed
+                      from the database, and the result DataFrame is still fully materialized,
+                      so use `max_rows` to bound its size.
+        chunk_size: The number of rows per chunk with `chunked_json`. Defaults to `JSON_CHUNK_SIZE`.
     """
     # If options for vega-embed have been provided, pass those to the renderer.
     embed_options = options.get("embed_options", None)
     assert type in ("vl", "vl-omnisci", "json", "sql")
-    if type == "vl":
-        display_type = lambda spec: VegaLite(
-            spec, metadata={"embed_options": embed_options}
-        )
-        display_data = EMPTY_SPEC
-    elif type == "vl-omnisci":
-        display_type = VegaLiteOmniSci
-        display_data = [EMPTY_SPEC, None]
-    elif type == "json":
-        display_type = CompatJSON
-        display_data = {"_": "Waiting for transformed spec..."}
-    elif type == "sql":
-        display_type = Code
-        display_data = "Waiting for transformed spec..."
+    if sample is not None:
+        assert approximate, "Sampling is only supported in approximate mode"
+        assert 0 < sample <= 1, "The sample fraction must be in (0, 1]"
+        assert compile, "Sampling requires compiling, to scale aggregates back up"
+    assert on_budget_exceeded in ("refuse", "limit")
+    timeout = QUERY_TIMEOUT if timeout is None else timeout
+    max_rows = QUERY_MAX_ROWS if max_rows is None else max_rows
+    display_type, display_data = display_types(type, embed_options)
 
     def to_data(spec):
         # if we should compile the expression, replace it with the updated
         # version and mutate the spec
-        all_expressions = []
-        for view in spec_views(spec):
-            if "data" not in view:
-                continue
-            # Retrieve the ibis expression based on the name of the data
-            expr = _name_to_ibis.pop(view["data"]["name"])
-            # If we are compiling, update the spec based on the expression
-            # and record the updated expression
-            if compile:
-                expr = update_spec(expr, view)
-            # Save the resulting expression so we can access it for the SQL output.
-            all_expressions.append(expr)
-            # If we are compiling to vega lite, get the data and run
-            # it through the default transformer (to_csv)
-            if type == "vl":
-                view["data"] = DEFAULT_TRANSFORMER(expr.execute())
-            # If we are compiling to backend rendered vega
-            # just record the SQL statement
-            elif type == "vl-omnisci":
-                view["data"] = {"sql": expr.compile()}
-
+        queries = compile_spec(spec, compile, approximate, sample)
+        # If we are compiling to vega lite, get the data and run
+        # it through the default transformer (to_csv)
         if type == "vl":
-            return spec
-        elif type == "vl-omnisci":
-            return [spec, get_client(all_expressions[0])]
-        elif type == "json":
-            return spec
-        elif type == "sql":
-            # TODO: return mutiple
-            return "\n".join(expr.compile() for expr in all_expressions)
+            for view, query in queries:
+                view["data"] = load_data(
+                    query.expr,
+                    view,
+                    timeout,
+                    max_rows,
+                    on_budget_exceeded,
+                    chunked_json,
+                    chunk_size,
+                )
+        return finish_spec(spec, queries, type, approximate)
 
     def to_display(spec) -> DisplayObject:
-        return display_type(to_data(spec))
+        try:
+            return display_type(to_data(spec))
+        except QueryBudgetError as e:
+            return HTML(f"<pre>{e}</pre>")
 
     if extract:
-        global DISPLAY_HANDLE
+        # Capture the render targets now, since the callbacks run
+        # after the context they were set in has been reset.
+        display_request = DISPLAY_REQUEST.get()
+        active_output = ACTIVE_OUTPUT.get()
 
-        if DISPLAY_HANDLE:
+        if display_request:
             # we are in vdom widget mode
+            # If the request is set but doesn't have a DisplayHandle yet
+            if not isinstance(display_request.handle, DisplayHandle):
+                display_request.handle = display(
+                    display_type(display_data), display_id=True
+                )
+            handle = display_request.handle
+
             def callback(s):
-                global DISPLAY_HANDLE
                 # Don't display if s == {}
                 if "$schema" in s:
-                    DISPLAY_HANDLE.update(to_display(s))
-                    DISPLAY_HANDLE = None
+                    handle.update(to_display(s))
 
-            # If DISPLAY_HANDLE is set but it's not a DisplayHandle yet
-            if not isinstance(DISPLAY_HANDLE, DisplayHandle):
-                DISPLAY_HANDLE = display(display_type(display_data), display_id=True)
             extract_spec(spec, callback)
-        elif ACTIVE_OUTPUT:
+        elif active_output:
             # we are in ipywidget mode
-            def callback(s, ACTIVE_OUTPUT=ACTIVE_OUTPUT):
-                ACTIVE_OUTPUT.clear_output(wait=True)
-                ACTIVE_OUTPUT.append_display_data(to_display(s))
+            def callback(s):
+                active_output.clear_output(wait=True)
+                active_output.append_display_data(to_display(s))
 
             extract_spec(spec, callback)
         else:
@@ -146,6 +229,218 @@ def ibis_renderer(spec, type="vl", extract=True, compile=True, **options):
     return get_ipython().display_formatter.format(to_display(spec))[0]  # noqa: F821
 
 
+def display_types(type, embed_options=None):
+    """
+    Returns the display object class for a renderer output type,
+    and the placeholder data to display while waiting for the transformed spec.
+    """
+    if type == "vl":
+        display_type = lambda spec: VegaLite(
+            spec, metadata={"embed_options": embed_options}
+        )
+        display_data = EMPTY_SPEC
+    elif type == "vl-omnisci":
+        display_type = VegaLiteOmniSci
+        display_data = [EMPTY_SPEC, None]
+    elif type == "json":
+        display_type = CompatJSON
+        display_data = {"_": "Waiting for transformed spec..."}
+    elif type == "sql":
+        display_type = Code
+        display_data = "Waiting for transformed spec..."
+    return display_type, display_data
+
+
+def compile_spec(spec, compile=True, approximate=False, sample=None):
+    """
+    Retrieves the ibis expression for each view of a spec with data,
+    compiling the view's transforms into it if `compile` is set.
+
+    Returns a list of (view, CompiledQuery) pairs.
+    """
+    queries = []
+    for view in spec_views(spec):
+        if "data" not in view:
+            continue
+        # Retrieve the ibis expression based on the name of the data
+        expr = _name_to_ibis.pop(view["data"]["name"])
+        # If we are compiling, update the spec based on the expression
+        # and record the updated expression
+        if compile and sample is not None:
+            transforms = deepcopy(view.get("transform"))
+            query = compile_view(
+                sample_expr(expr, sample),
+                view,
+                approximate=approximate,
+                scale=1 / sample,
+            )
+            if has_scaled_aggregates(view):
+                # Vega Lite would aggregate the sample without scaling it back up,
+                # so compile this view again without sampling.
+                if transforms is None:
+                    view.pop("transform", None)
+                else:
+                    view["transform"] = transforms
+                query = compile_view(expr, view, approximate=approximate)
+        elif compile:
+            query = compile_view(expr, view, approximate=approximate)
+        else:
+            query = CompiledQuery(expr, view.get("transform"))
+        queries.append((view, query))
+    return queries
+
+
+def finish_spec(spec, queries, type, approximate=False):
+    """
+    Returns the data to display for a spec once its queries have been compiled,
+    and, for 'vl', executed.
+    """
+    # If we are compiling to backend rendered vega
+    # just record the SQL statement
+    if type == "vl-omnisci":
+        for view, query in queries:
+            view["data"] = {"sql": query.sql}
+
+    if approximate:
+        mark_approximate(spec)
+
+    if type == "vl":
+        return spec
+    elif type == "vl-omnisci":
+        return [spec, get_client(queries[0][1].expr)]
+    elif type == "json":
+        return spec
+    elif type == "sql":
+        # TODO: return mutiple
+        sql = "\n".join(query.sql for _, query in queries)
+        return f"-- approximate\n{sql}" if approximate else sql
+
+
+def render_dashboard(
+    charts,
+    type="vl",
+    extract=True,
+    compile=True,
+    approximate=False,
+    sample=None,
+    timeout=None,
+    max_rows=None,
+    on_budget_exceeded="refuse",
+    chunked_json=False,
+    chunk_size=None,
+    embed_options=None,
+):
+    """
+    Render many Altair charts around Ibis expressions at once.
+
+    All specs are sent to the frontend in a single extraction message,
+    and the resulting queries are planned together, deduplicated, and run
+    concurrently, each on its own connection. Each chart's display is updated as
+    soon as its queries finish, so the dashboard takes about as long as its slowest
+    query. If a query fails, only the charts using it show the error.
+    The `ibis` data transformer must be enabled.
+
+    Arguments are the same as for the `ibis` renderer.
+    Returns the display handles of the charts, in order.
+    """
+    assert type in ("vl", "vl-omnisci", "json", "sql")
+    if sample is not None:
+        assert approximate, "Sampling is only supported in approximate mode"
+        assert 0 < sample <= 1, "The sample fraction must be in (0, 1]"
+        assert compile, "Sampling requires compiling, to scale aggregates back up"
+    assert on_budget_exceeded in ("refuse", "limit")
+    timeout = QUERY_TIMEOUT if timeout is None else timeout
+    max_rows = QUERY_MAX_ROWS if max_rows is None else max_rows
+    display_type, display_data = display_types(type, embed_options)
+
+    specs = [chart.to_dict() for chart in charts]
+    handles = [display(display_type(display_data), display_id=True) for _ in specs]
+
+    def render(specs):
+        planned = [[] for _ in specs]
+        remaining = [0 for _ in specs]
+        failed = set()
+
+        def fail(i, error):
+            failed.add(i)
+            handles[i].update(HTML(f"<pre>{html.escape(error)}</pre>"))
+
+        def finish(i):
+            handles[i].update(
+                display_type(finish_spec(specs[i], planned[i], type, approximate))
+            )
+
+        # Plan each chart on its own, so a chart that fails to compile
+        # shows its error without taking down the rest of the dashboard.
+        # Queries shared between charts are deduped by their SQL.
+        views_by_sql = {}
+        for i, spec in enumerate(specs):
+            try:
+                planned[i] = compile_spec(spec, compile, approximate, sample)
+                if type != "vl" or not planned[i]:
+                    finish(i)
+                    continue
+                sqls = [query.sql for _, query in planned[i]]
+            except Exception as e:
+                logger.exception("Dashboard chart failed to compile")
+                fail(i, f"{e.__class__.__name__}: {e}")
+                continue
+            remaining[i] = len(sqls)
+            for sql, (view, query) in zip(sqls, planned[i]):
+                views_by_sql.setdefault(sql, (query, []))[1].append((i, view))
+        if not views_by_sql:
+            return
+
+        workers = min(len(views_by_sql), DASHBOARD_MAX_WORKERS)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for query, views in views_by_sql.values():
+                meta = {}
+                future = pool.submit(
+                    load_data,
+                    query.expr,
+                    meta,
+                    timeout,
+                    max_rows,
+                    on_budget_exceeded,
+                    chunked_json,
+                    chunk_size,
+                    dedicated=True,
+                )
+                futures[future] = (meta, views)
+            for future in concurrent.futures.as_completed(futures):
+                meta, views = futures[future]
+                try:
+                    data, error = future.result(), None
+                except QueryBudgetError as e:
+                    data, error = None, str(e)
+                except Exception as e:
+                    # Only the charts using this query fail, the others carry on.
+                    logger.exception("Dashboard query failed")
+                    data, error = None, f"{e.__class__.__name__}: {e}"
+                for i, view in views:
+                    if i in failed:
+                        continue
+                    if error:
+                        fail(i, error)
+                        continue
+                    view["data"] = data
+                    if "usermeta" in meta:
+                        view["usermeta"] = {
+                            **view.get("usermeta", {}),
+                            **meta["usermeta"],
+                        }
+                    remaining[i] -= 1
+                    if not remaining[i]:
+                        finish(i)
+
+    if extract:
+        extract_specs(specs, render)
+    else:
+        render(specs)
+    return handles
+
+
 def interactive_chart(f, controls):
     """
     Connect Altair chart to a function.
@@ -157,13 +452,14 @@ def interactive_chart(f, controls):
     out = ipywidgets.Output()
 
     def observer(change, out=out):
-        global ACTIVE_OUTPUT
         kwargs = {k: v.value for k, v in controls.items()}
         out.clear_output(wait=True)
 
-        ACTIVE_OUTPUT = out
-        f(**kwargs)._repr_mimebundle_(None, None)
-        ACTIVE_OUTPUT = None
+        token = ACTIVE_OUTPUT.set(out)
+        try:
+            f(**kwargs)._repr_mimebundle_(None, None)
+        finally:
+            ACTIVE_OUTPUT.reset(token)
 
     for k, w in controls.items():
         w.observe(observer, "value")
@@ -178,12 +474,13 @@ def get_display(f, *args, display_handle=True, **kwargs):
         chart_handle = jupyterlab_omnisci.get_display(render_chart, *args)
     """
 
-    global DISPLAY_HANDLE
-
-    DISPLAY_HANDLE = display_handle
-    f(*args, **kwargs)._repr_mimebundle_(None, None)
-    # return DISPLAY_HANDLE
-    return copy(DISPLAY_HANDLE)
+    request = DisplayRequest(display_handle)
+    token = DISPLAY_REQUEST.set(request)
+    try:
+        f(*args, **kwargs)._repr_mimebundle_(None, None)
+    finally:
+        DISPLAY_REQUEST.reset(token)
+    return request.handle
 
 
 ##
@@ -238,6 +535,273 @@ def extract_spec(spec, callback):
         callback(msg["content"]["data"])
 
 
+class QueryBudgetError(RuntimeError):
+    """
+    Raised when a chart's query exceeds its time or size budget.
+    """
+
+
+def load_data(
+    expr,
+    view,
+    timeout=None,
+    max_rows=None,
+    on_budget_exceeded="refuse",
+    chunked_json=False,
+    chunk_size=None,
+    dedicated=False,
+):
+    """
+    Executes an ibis expression within its budget, returning Vega Lite data for a view.
+
+    If `dedicated` is set, the query runs on its own `QueryConnection`,
+    which is required when running queries concurrently.
+    """
+    data = execute_within_budget(
+        expr, view, timeout, max_rows, on_budget_exceeded, dedicated
+    )
+    if chunked_json:
+        schema = expr.schema()
+        decimals = [
+            name
+            for name, type in zip(schema.names, schema.types)
+            if isinstance(type, dt.Decimal)
+        ]
+        return to_json_chunks(data, chunk_size, decimals)
+    return DEFAULT_TRANSFORMER(data)
+
+
+def to_json_chunks(data, chunk_size=None, decimals=()):
+    """
+    Writes a DataFrame to a JSON data file one chunk of rows at a time,
+    so that the JSON for the whole result is never held in memory at once.
+    The DataFrame itself is already in memory, so its size is not bounded.
+
+    Like `altair.utils.data.to_json`, each chunk is sanitized by altair first,
+    the file is named by the hash of its contents, and a Vega Lite data dict
+    pointing to it is returned. The `decimals` columns are written as numbers,
+    rather than the strings pandas writes for `Decimal` values.
+    """
+    chunk_size = chunk_size or JSON_CHUNK_SIZE
+    digest = hashlib.md5()
+    fd, path = tempfile.mkstemp(prefix=".altair-data-", suffix=".json", dir=".")
+    try:
+        with os.fdopen(fd, "w") as f:
+
+            def write(text):
+                f.write(text)
+                digest.update(text.encode("utf-8"))
+
+            write("[")
+            for start in range(0, len(data), chunk_size):
+                chunk = data.iloc[start : start + chunk_size]
+                chunk = chunk.astype({name: float for name in decimals})
+                chunk = altair.utils.sanitize_dataframe(chunk)
+                records = chunk.to_json(orient="records", double_precision=15)
+                # Strip the brackets, so the chunks join into a single array.
+                write(("," if start else "") + records[1:-1])
+            write("]")
+    except BaseException:
+        os.remove(path)
+        raise
+    filename = f"altair-data-{digest.hexdigest()}.json"
+    os.replace(path, filename)
+    return {"url": filename, "format": {"type": "json"}}
+
+
+def execute_within_budget(
+    expr,
+    view,
+    timeout=None,
+    max_rows=None,
+    on_budget_exceeded="refuse",
+    dedicated=False,
+):
+    """
+    Executes an ibis expression, enforcing a time budget and a maximum result size.
+
+    If `max_rows` is set, the query is limited to one more row than that, and if
+    the extra row comes back the result is either refused or truncated,
+    in which case the view is marked as truncated. There is no estimate of a
+    query's cost before it runs, so this bounds only the size of the result,
+    not the rows the query scans; only the `timeout` bounds that.
+    If the query runs past the `timeout`, it is interrupted and a
+    `QueryBudgetError` is raised.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    if max_rows is None:
+        return execute_with_timeout(expr, deadline, dedicated)
+    result = execute_with_timeout(expr.limit(max_rows + 1), deadline, dedicated)
+    if len(result) > max_rows:
+        logger.warning("Chart query returned more than the budget of %d rows", max_rows)
+        if on_budget_exceeded == "refuse":
+            raise QueryBudgetError(
+                f"Query returned more than the budget of {max_rows} rows"
+            )
+        result = result.iloc[:max_rows]
+        view["usermeta"] = {**view.get("usermeta", {}), "truncated": True}
+    return result
+
+
+def execute_with_timeout(expr, deadline=None, dedicated=False):
+    """
+    Executes an ibis expression, interrupting it if it runs past the deadline
+    (in the `time.monotonic` clock).
+
+    Queries with a deadline run on their own worker thread with their own
+    `QueryConnection`, so that an abandoned query never shares a connection
+    with later ones, nor holds up their workers while it finishes.
+    If `dedicated` is set, queries without a deadline get their own connection too.
+
+    Expressions on backends other than OmniSci are executed directly,
+    without enforcing the deadline.
+    """
+    connection = query_connection(expr) if deadline is not None or dedicated else None
+    if connection is None:
+        return expr.execute()
+    if deadline is None:
+        return connection.execute(expr)
+    start = time.monotonic()
+    future = _run_in_thread(connection.execute, expr)
+    try:
+        result = future.result(max(deadline - start, 0))
+    except concurrent.futures.TimeoutError:
+        connection.interrupt()
+        logger.warning("Chart query timed out after %.2fs", time.monotonic() - start)
+        raise QueryBudgetError("Query exceeded its time budget") from None
+    logger.debug("Chart query finished in %.2fs", time.monotonic() - start)
+    return result
+
+
+def _run_in_thread(fn, *args):
+    """
+    Calls a function on a new daemon thread, returning a future for its result.
+
+    A timed out query may keep its thread blocked until the server replies,
+    so queries are not run on a fixed size pool, which abandoned queries could fill.
+    """
+    future = concurrent.futures.Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="ibis-renderer-query", daemon=True).start()
+    return future
+
+
+def query_connection(expr):
+    """
+    Returns a `QueryConnection` for the backend of an ibis expression,
+    or None if it isn't an OmniSci backend.
+    """
+    client = next(iter(ibis.client.find_backends(expr)), None)
+    if not hasattr(client, "host") or not hasattr(
+        getattr(client, "con", None), "_session"
+    ):
+        return None
+    return QueryConnection(client)
+
+
+class QueryConnection:
+    """
+    A dedicated connection to an OmniSci client's server, for running
+    a single query off of the main thread. Thrift clients are not thread safe,
+    so a query on a worker thread must not share the client's socket.
+
+    If the client has credentials, the connection logs in to its own session,
+    so interrupting it cancels only its own query. Otherwise it shares the
+    client's session, and is never interrupted, since OmniSci interrupts
+    every query on a session at once: the query runs to completion on the server,
+    and its worker thread is abandoned until it does.
+    """
+
+    def __init__(self, client):
+        self._options = dict(
+            host=client.host,
+            port=client.port,
+            protocol=client.protocol,
+            database=client.db_name,
+        )
+        self.own_session = bool(client.password)
+        if self.own_session:
+            self.client = ibis.omniscidb.connect(
+                user=client.user, password=client.password, **self._options
+            )
+        else:
+            self.client = ibis.omniscidb.connect(
+                session_id=client.con._session, **self._options
+            )
+        self.session = self.client.con._session
+
+    def execute(self, expr):
+        """
+        Executes an expression on this connection, then closes it.
+        """
+        try:
+            return self.client.execute(expr)
+        finally:
+            self.close()
+
+    def interrupt(self):
+        """
+        Interrupts the query running on this connection's session.
+
+        The query's socket is busy waiting for the reply, so this goes through
+        a second socket on the same session. The worker closes the connection
+        once the interrupted query returns.
+        """
+        if not self.own_session:
+            logger.warning(
+                "Not interrupting timed out query, since its session is shared"
+            )
+            return
+        try:
+            con = ibis.omniscidb.connect(session_id=self.session, **self._options).con
+            try:
+                con._client.interrupt(self.session)
+            finally:
+                _close_transport(con)
+        except Exception:
+            logger.exception("Could not interrupt query")
+
+    def close(self):
+        """
+        Closes the connection, logging out only if it has its own session.
+        """
+        con = self.client.con
+        if self.own_session:
+            con.close()
+        else:
+            _close_transport(con)
+
+
+def _close_transport(con):
+    """
+    Close the socket of a pymapd connection, without disconnecting its session.
+    """
+    try:
+        con._client._iprot.trans.close()
+    except Exception:
+        pass
+
+
+def extract_specs(specs, callback):
+    """
+    Calls extract_transform on the frontend for many specs with a single comm message,
+    and calls the callback with the list of transformed specs.
+    """
+    my_comm = ipykernel.comm.Comm(target_name=BATCH_COMM_ID, data={"specs": specs})
+
+    @my_comm.on_msg
+    def _recv(msg):
+        callback(msg["content"]["data"]["specs"])
+
+
 def empty(expr):
     """
     Creates an empty DF for a ibis expression, based on the schema
@@ -273,7 +837,8 @@ def monkeypatch_altair():
     altair.Chart.__init__ = updated_chart_init
 
 
-_i = 0
+# Counter for unique data names, safe to use from concurrent renders
+_names = itertools.count()
 # Mapping from data name to ibis expression
 _name_to_ibis = {}
 
@@ -303,28 +868,128 @@ def ibis_transformation(data):
     save the ibis expression globally with that name so we can pick it up later.
     """
     assert isinstance(data, pandas.DataFrame)
-    global _i
-    name = f"ibis_{_i}"
-    _i += 1
+    name = f"ibis_{next(_names)}"
     _name_to_ibis[name] = data.ibis
     return {"name": name}
 
 
-def translate_op(op):
+def translate_op(op, approximate=False):
+    if approximate and op in APPROXIMATE_OPS:
+        return APPROXIMATE_OPS[op]
     return {"mean": "mean", "average": "mean"}.get(op, op)
 
 
-def vl_aggregate_to_grouping_expr(expr, a):
+# Mapping from Vega Lite aggregate ops to approximate Ibis equivalents
+APPROXIMATE_OPS = {"distinct": "approx_nunique"}
+
+# Mapping from Vega Lite quantile ops to the quantile to approximate
+APPROXIMATE_QUANTILES = {"median": 0.5, "q1": 0.25, "q3": 0.75}
+
+# Vega Lite aggregate ops which should be scaled up when computed over a sample
+SCALED_OPS = {"count", "valid", "missing", "sum"}
+
+
+def vl_aggregate_to_grouping_expr(expr, a, approximate=False, scale=1):
     if "field" in a:
         expr = expr[a["field"]]
-    op = translate_op(a["op"])
-    expr = getattr(expr, op)()
+    if approximate and a["op"] in APPROXIMATE_QUANTILES:
+        expr = ApproxPercentile(expr, APPROXIMATE_QUANTILES[a["op"]]).to_expr()
+    else:
+        expr = getattr(expr, translate_op(a["op"], approximate))()
+    if scale != 1 and a["op"] in SCALED_OPS:
+        expr = expr * scale
+        if a["op"] != "sum":
+            # OmniSci doesn't support ROUND, so round half up by truncating.
+            expr = (expr + 0.5).cast("int64")
     return expr.name(a["as"])
 
 
-def update_spec(expr, spec):
+class ApproxPercentile(ops.Reduction):
+    """
+    OmniSci's `APPROX_PERCENTILE` aggregate, estimating the `quantile` of a column.
+    """
+
+    arg = Arg(rlz.column(rlz.numeric))
+    quantile = Arg(rlz.double)
+
+    def output_type(self):
+        return dt.float64.scalar_type()
+
+
+@ibis.omniscidb.compiles(ApproxPercentile)
+def _compile_approx_percentile(translator, expr):
+    arg, quantile = expr.op().args
+    return (
+        f"APPROX_PERCENTILE({translator.translate(arg)}, "
+        f"{translator.translate(quantile)})"
+    )
+
+
+class SampleRatio(ops.ValueOp):
+    """
+    OmniSci's `SAMPLE_RATIO` predicate, which is true for roughly `ratio` of the rows.
+
+    It takes a column of the table being sampled only so that ibis treats it as a
+    row-wise predicate, rather than a scalar, when filtering; the column is not
+    part of the SQL.
+    """
+
+    arg = Arg(rlz.column(rlz.any))
+    ratio = Arg(rlz.double)
+    output_type = rlz.shape_like("arg", dt.boolean)
+
+
+@ibis.omniscidb.compiles(SampleRatio)
+def _compile_sample_ratio(translator, expr):
+    _, ratio = expr.op().args
+    return f"SAMPLE_RATIO({translator.translate(ratio)})"
+
+
+def sample_expr(expr, fraction):
+    """
+    Returns a random sample of roughly `fraction` of the rows of an ibis expression.
+    """
+    if fraction >= 1:
+        return expr
+    return expr.filter(SampleRatio(expr[expr.columns[0]], fraction).to_expr())
+
+
+def has_scaled_aggregates(view):
+    """
+    Whether a view has counts or sums left for Vega Lite to compute,
+    in its transforms or its encoding.
+    """
+    for transform in view.get("transform", []):
+        for key in ("aggregate", "joinaggregate", "window"):
+            if any(a.get("op") in SCALED_OPS for a in transform.get(key, [])):
+                return True
+    return any(
+        isinstance(channel, dict) and channel.get("aggregate") in SCALED_OPS
+        for channel in view.get("encoding", {}).values()
+    )
+
+
+def mark_approximate(spec):
+    """
+    Marks a vega lite spec as approximate, in its title and its metadata.
+    """
+    title = spec.get("title")
+    if isinstance(title, dict):
+        title = {**title, "text": f"{title.get('text', '')} (approximate)".strip()}
+    elif title:
+        title = f"{title} (approximate)"
+    else:
+        title = "(approximate)"
+    spec["title"] = title
+    spec["usermeta"] = {**spec.get("usermeta", {}), "approximate": True}
+
+
+def update_spec(expr, spec, approximate=False, scale=1):
     """
     Takes in an ibis expression and a spec, updating the spec and returning a new ibis expr
+
+    If `approximate` is set, aggregates are compiled to approximate equivalents where available.
+    If the expression is sampled, `scale` is the factor to scale counts and sums back up by.
     """
     original_expr = expr
 
@@ -344,7 +1009,10 @@ def update_spec(expr, spec):
         aggregate = transform.pop("aggregate", None)
         if aggregate:
             expr = expr.aggregate(
-                [vl_aggregate_to_grouping_expr(original_expr, a) for a in aggregate]
+                [
+                    vl_aggregate_to_grouping_expr(original_expr, a, approximate, scale)
+                    for a in aggregate
+                ]
             )
 
         filter_ = transform.pop("filter", None)
@@ -380,6 +1048,74 @@ def update_spec(expr, spec):
     return expr
 
 
+class CompiledQuery:
+    """
+    The result of moving a view's transforms into an ibis expression:
+    the rewritten expression, its SQL, and the transforms left on the view.
+
+    The SQL is compiled lazily, and only once.
+    """
+
+    def __init__(self, expr, transforms):
+        self.expr = expr
+        self.transforms = transforms
+        self._sql = None
+
+    @property
+    def sql(self):
+        if self._sql is None:
+            self._sql = self.expr.compile()
+        return self._sql
+
+
+# Mapping from (expression hash, transforms, options) to a list of
+# (base expression, compiled query) pairs, in least recently used order.
+_compiled_queries = collections.OrderedDict()
+_compiled_queries_lock = threading.Lock()
+
+
+def compile_view(expr, view, approximate=False, scale=1):
+    """
+    Memoized version of `update_spec`, returning a `CompiledQuery`.
+
+    Queries are keyed by a structural hash of the base expression and the
+    canonical (key sorted) JSON of the view's transforms, so re-rendering an
+    unchanged chart skips rebuilding and recompiling the expression.
+    """
+    transforms = view.get("transform", [])
+    try:
+        key = (
+            hash(expr.op()),
+            json.dumps(transforms, sort_keys=True),
+            approximate,
+            scale,
+        )
+    except TypeError:
+        # Some expressions (e.g. over in-memory data) are not hashable
+        expr = update_spec(expr, view, approximate=approximate, scale=scale)
+        return CompiledQuery(expr, view.get("transform"))
+
+    with _compiled_queries_lock:
+        for base, query in _compiled_queries.get(key, ()):
+            # Guard against hash collisions with a structural comparison.
+            if base.equals(expr):
+                _compiled_queries.move_to_end(key)
+                if query.transforms:
+                    view["transform"] = deepcopy(query.transforms)
+                else:
+                    view.pop("transform", None)
+                return query
+
+    rewritten = update_spec(expr, view, approximate=approximate, scale=scale)
+    query = CompiledQuery(rewritten, deepcopy(view.get("transform")))
+    with _compiled_queries_lock:
+        _compiled_queries.setdefault(key, []).append((expr, query))
+        _compiled_queries.move_to_end(key)
+        while len(_compiled_queries) > COMPILED_QUERY_CACHE_SIZE:
+            _compiled_queries.popitem(last=False)
+    return query
+
+
 altair.renderers.register("ibis", ibis_renderer)
 altair.data_transformers.register("ibis", ibis_transformation)
 monkeypatch_altair()
@@ -1,18 +1,23 @@
 """
 Importing this module registers Jupyter cell magics for rendering
-Vega Lite and Vega in the MapD server and for rendering a SQL editor given a query.
+Vega Lite and Vega in the MapD server, for rendering a SQL editor given a query,
+and for running SQL into a DataFrame.
 """
 
 import ast
+import collections
+import time
 import yaml
 import urllib.parse
 
 import ibis
+import pandas
 import pymapd
 
 __all__ = ["OmniSciVegaRenderer", "OmniSciSQLEditorRenderer"]
 
-from IPython.core.magic import register_cell_magic
+from IPython.core.error import UsageError
+from IPython.core.magic import register_cell_magic, register_line_cell_magic
 from IPython.display import display
 
 # Allow this module to be imported outside of an IPython context
@@ -21,6 +26,10 @@ try:
     get_ipython()  # noqa
 except Exception:
     register_cell_magic = lambda x: x
+    register_line_cell_magic = lambda x: x
+
+# Maximum number of query results kept by `%%omnisci_sql --cache`
+SQL_CACHE_SIZE = 32
 
 
 class OmniSciVegaRenderer:
@@ -160,6 +169,194 @@ def omnisci_sqleditor(line, cell):
     display(OmniSciSQLEditorRenderer(connection_data, cell))
 
 
+# Options for `%%omnisci_sql`, mapped to their names and the
+# types of their values (None for flags without values).
+_SQL_OPTIONS = {
+    "--limit": ("limit", int),
+    "--sample": ("sample", float),
+    "--cache": ("cache", None),
+    "--connection": ("connection", str),
+    "-c": ("connection", str),
+}
+
+# Pooled pymapd connections, keyed by their connection data
+_sql_connections = {}
+
+# The last connection used by `%%omnisci_sql`, used when none is given
+_last_sql_connection = None
+
+# Cached query results, keyed by connection and query, in least recently used order
+_sql_results = collections.OrderedDict()
+
+
+@register_line_cell_magic
+def omnisci_sql(line, cell=None):
+    """
+    Line and cell magic for running SQL against OmniSci into a DataFrame.
+
+    Usage as a cell magic: `%%omnisci_sql [options] $connection_data`,
+    where `connection_data` is the dictionary containing the connection
+    data for the OmniSci server. A pymapd connection or ibis client can't be
+    expanded with `$`, so pass the bare name of its variable instead,
+    e.g. `%%omnisci_sql con`. The rest of the cell should be the query.
+
+    Usage as a line magic: `%omnisci_sql [options] query`, which uses the
+    connection given with `--connection`, or the last connection used.
+
+    Options:
+        --limit N: Return at most N rows.
+        --sample F: Sample roughly a fraction F of the result rows. This samples
+                    the output of the query, so it saves no work for aggregates,
+                    and drops whole groups from them.
+        --cache: Reuse the result of an identical earlier query on the same connection.
+        --connection, -c NAME: The variable holding the connection data.
+
+    Connections are reused between queries, and results are fetched
+    through Arrow when possible.
+    """
+    global _last_sql_connection
+
+    options, rest = _parse_sql_options(line)
+    if cell is None:
+        query = rest
+    else:
+        query = cell
+        if rest:
+            options.setdefault("connection", rest)
+    if "connection" in options:
+        connection = _resolve_connection(options["connection"])
+    elif _last_sql_connection is not None:
+        connection = _last_sql_connection
+    else:
+        raise UsageError("No OmniSci connection given")
+    _last_sql_connection = connection
+
+    query = query.strip().rstrip(";")
+    if not query:
+        raise UsageError("No query given")
+    if "sample" in options:
+        query = f"SELECT * FROM ({query}) AS t WHERE SAMPLE_RATIO({options['sample']})"
+    if "limit" in options:
+        query = f"SELECT * FROM ({query}) AS t LIMIT {options['limit']}"
+
+    con, key = _pooled_connection(connection)
+    start = time.perf_counter()
+    if options.get("cache") and (key, query) in _sql_results:
+        _sql_results.move_to_end((key, query))
+        df, path = _sql_results[(key, query)], "cache"
+    else:
+        df, path = _select_df(con, query)
+        if options.get("cache"):
+            _sql_results[(key, query)] = df
+            while len(_sql_results) > SQL_CACHE_SIZE:
+                _sql_results.popitem(last=False)
+    elapsed = time.perf_counter() - start
+    print(f"{len(df)} rows in {elapsed:.3f}s ({path})")
+    return df
+
+
+def _parse_sql_options(line):
+    """
+    Parse the leading options of an `%%omnisci_sql` line,
+    returning a dictionary of options and the rest of the line.
+
+    The rest of the line is left untouched, since it may be SQL.
+    """
+    options = {}
+    rest = line.strip()
+    while rest.startswith("-"):
+        flag, _, rest = rest.partition(" ")
+        flag, equals, value = flag.partition("=")
+        if flag not in _SQL_OPTIONS:
+            raise UsageError(f"Unknown option {flag}")
+        name, kind = _SQL_OPTIONS[flag]
+        if kind is None:
+            options[name] = True
+        else:
+            if not equals:
+                value, _, rest = rest.lstrip().partition(" ")
+            try:
+                options[name] = kind(value)
+            except ValueError:
+                raise UsageError(f"Invalid value for {flag}: {value!r}")
+        rest = rest.lstrip()
+    return options, rest
+
+
+def _resolve_connection(connection):
+    """
+    Resolve a connection given on a magic line, either as the name
+    of a variable in the user namespace, or as a dictionary literal.
+    """
+    user_ns = get_ipython().user_ns  # noqa: F821
+    if connection in user_ns:
+        return user_ns[connection]
+    try:
+        return ast.literal_eval(connection)
+    except (ValueError, SyntaxError):
+        raise UsageError(
+            f"Invalid connection {connection!r}: give a dictionary of connection data, "
+            "or the name of a variable holding one, a pymapd connection, or an ibis client"
+        )
+
+
+def _pooled_connection(connection):
+    """
+    Given a dictionary, pymapd connection, or ibis client,
+    return a pymapd connection and a key identifying it.
+
+    Connections created from dictionaries are kept open and reused.
+    """
+    if isinstance(connection, ibis.omniscidb.OmniSciDBClient):
+        connection = connection.con
+    if isinstance(connection, pymapd.Connection):
+        return connection, id(connection)
+    key = tuple(sorted((k, str(v)) for k, v in connection.items()))
+    con = _sql_connections.get(key)
+    if con is None or con.closed:
+        con = pymapd.connect(
+            user=connection.get("username"),
+            password=connection.get("password"),
+            host=connection.get("host"),
+            port=connection.get("port"),
+            dbname=connection.get("database"),
+            protocol=connection.get("protocol", "binary"),
+            sessionid=connection.get("session"),
+        )
+        _sql_connections[key] = con
+    return con, key
+
+
+def _select_df(con, query):
+    """
+    Run a query into a DataFrame, returning it along with the path used.
+
+    Prefer Arrow IPC, which shares memory with the server and so only works
+    when it is on the same host, and otherwise use the row-wise cursor.
+    Only fall back if IPC is unavailable (pyarrow is missing), so that
+    a failing query is never run twice.
+    """
+    if _is_local(con):
+        try:
+            return con.select_ipc(query), "arrow"
+        except ImportError:
+            pass
+    cursor = con.execute(query)
+    try:
+        columns = [column[0] for column in cursor.description]
+        return pandas.DataFrame.from_records(list(cursor), columns=columns), "cursor"
+    finally:
+        cursor.close()
+
+
+def _is_local(con):
+    """
+    Whether a pymapd connection is to a server on this host.
+    """
+    host = urllib.parse.urlparse(con._host).hostname or con._host
+    return host in ("localhost", "127.0.0.1", "::1")
+
+
 def _make_connection(connection):
     """
     Given a connection client, return JSON-serializable dictionary
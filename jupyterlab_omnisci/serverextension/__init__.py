@@ -2,7 +2,13 @@ from notebook.utils import url_path_join
 
 from jupyterlab_server import LabConfig
 
-from .handlers import OmniSciSessionHandler
+from .config import OmniSciConfig
+from .handlers import (
+    OmniSciRenderedImageHandler,
+    OmniSciRenderHandler,
+    OmniSciSessionHandler,
+)
+from .render import RenderCache
 
 
 def _jupyter_server_extension_paths():
@@ -18,11 +24,31 @@ def load_jupyter_server_extension(nb_server_app):
             handle to the Notebook webserver instance.
     """
     lab_config = LabConfig(config=nb_server_app.config)
+    omnisci_config = OmniSciConfig(config=nb_server_app.config)
     web_app = nb_server_app.web_app
     base_url = web_app.settings["base_url"]
     lab_path = url_path_join(base_url)
 
+    # The render cache lives as long as the server, and is shared by all requests.
+    render_cache = RenderCache(
+        omnisci_config.render_cache_size, omnisci_config.render_cache_ttl
+    )
+    renderer = omnisci_config.omnisci_renderer
+
     omnisci_session_endpoint = url_path_join(lab_path, "omnisci/session")
+    omnisci_render_endpoint = url_path_join(lab_path, "omnisci/render")
     print(omnisci_session_endpoint)
-    handlers = [(omnisci_session_endpoint, OmniSciSessionHandler)]
+    handlers = [
+        (omnisci_session_endpoint, OmniSciSessionHandler),
+        (
+            omnisci_render_endpoint,
+            OmniSciRenderHandler,
+            {"cache": render_cache, "renderer": renderer},
+        ),
+        (
+            url_path_join(omnisci_render_endpoint, r"([0-9a-f]+)"),
+            OmniSciRenderedImageHandler,
+            {"cache": render_cache},
+        ),
+    ]
     web_app.add_handlers(".*$", handlers)
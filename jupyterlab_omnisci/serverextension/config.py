@@ -1,6 +1,7 @@
-from traitlets import Instance, default
+from traitlets import Float, Instance, Integer, default
 from traitlets.config import Configurable
 
+from .render import BaseOmniSciRenderer, OmniSciRenderer
 from .session import BaseOmniSciSessionManager, OmniSciSessionManager
 
 
@@ -15,9 +16,36 @@ class OmniSciConfig(Configurable):
         help="A manager instance that knows how to get data for an active OmniSci session",
     )
 
+    omnisci_renderer = Instance(
+        BaseOmniSciRenderer,
+        config=True,
+        help="A renderer instance that knows how to render OmniSci Vega to a PNG image",
+    )
+
+    render_cache_size = Integer(
+        default_value=256 * 1024 * 1024,
+        config=True,
+        help="The maximum total size in bytes of rendered images kept in the server-side cache",
+    )
+
+    render_cache_ttl = Float(
+        default_value=None,
+        allow_none=True,
+        config=True,
+        help="The number of seconds rendered images stay valid in the server-side cache, "
+        "or None to keep them until evicted",
+    )
+
     @default("omnisci_session_manager")
     def _default_omnisci_session_manager(self):
         """
         Default to session in an ephemeral file, others as environment variables.
         """
         return OmniSciSessionManager(config=self.config)
+
+    @default("omnisci_renderer")
+    def _default_omnisci_renderer(self):
+        """
+        Default to rendering on the OmniSci server through pymapd.
+        """
+        return OmniSciRenderer(config=self.config)
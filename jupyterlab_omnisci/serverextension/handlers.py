@@ -1,7 +1,9 @@
 from tornado import web
+from tornado.ioloop import IOLoop
 
-from jupyterlab_server.server import APIHandler
+from jupyterlab_server.server import APIHandler, JupyterHandler
 from .config import OmniSciConfig
+from .render import render_key
 
 
 class OmniSciSessionHandler(APIHandler):
@@ -27,3 +29,97 @@ class OmniSciSessionHandler(APIHandler):
         except Exception as e:
             self.set_status(500)
             self.finish(e)
+
+
+class OmniSciRenderHandler(APIHandler):
+    """
+    A tornado request handler that renders OmniSci Vega on the server,
+    caching the resulting images.
+
+    Images are keyed by the normalized Vega spec plus the session and database.
+    The response only carries the key, and the image itself is fetched from
+    `OmniSciRenderedImageHandler`, so that browsers can cache it.
+    """
+
+    def initialize(self, cache, renderer):
+        self.cache = cache
+        self.renderer = renderer
+
+    @web.authenticated
+    async def post(self):
+        """
+        Handle a POST request with a JSON body containing `vega`, `connection`,
+        and an optional `sessionId`. If `refresh` is set, any cached image is
+        rendered again, e.g. because the data behind it has changed.
+        Responds with the key of the rendered image.
+        """
+        body = self.get_json_body() or {}
+        vega = body.get("vega")
+        if vega is None:
+            raise web.HTTPError(400, "A vega spec is required")
+        connection = body.get("connection") or {}
+        session = body.get("sessionId")
+
+        key = render_key(vega, connection, session)
+        image = None if body.get("refresh") else self.cache.get(key)
+        if image is None:
+            future = self.cache.pending.get(key)
+            if future is None:
+                future = self._render(key, vega, connection, session)
+                self.set_header("X-OmniSci-Render-Cache", "miss")
+            else:
+                self.set_header("X-OmniSci-Render-Cache", "pending")
+            try:
+                await future
+            except Exception as e:
+                raise web.HTTPError(500, str(e))
+        else:
+            self.set_header("X-OmniSci-Render-Cache", "hit")
+
+        self.finish({"id": key})
+
+    def _render(self, key, vega, connection, session):
+        """
+        Start rendering an image, returning a future shared by all requests for it
+        until it finishes, when it is stored in the cache.
+        """
+        cache = self.cache
+        # Rendering blocks on the OmniSci server, so keep it off the event loop.
+        future = IOLoop.current().run_in_executor(
+            None, self.renderer.render, vega, connection, session
+        )
+        cache.pending[key] = future
+
+        def done(future):
+            cache.pending.pop(key, None)
+            if not future.cancelled() and future.exception() is None:
+                cache.put(key, future.result())
+
+        future.add_done_callback(done)
+        return future
+
+
+class OmniSciRenderedImageHandler(JupyterHandler):
+    """
+    A tornado request handler that serves a previously rendered image by its key.
+
+    This is not an `APIHandler`, which would send the image as JSON.
+    Tornado sets the ETag from the image data and answers conditional requests
+    with a 304, so a browser revalidating its copy skips downloading it again,
+    while an image rendered again after expiring gets a new ETag.
+    """
+
+    def initialize(self, cache):
+        self.cache = cache
+
+    @web.authenticated
+    def get(self, key):
+        """
+        Handle a GET request for a cached PNG.
+        """
+        image = self.cache.get(key)
+        if image is None:
+            raise web.HTTPError(404, f"No rendered image for {key}")
+        self.set_header("Content-Type", "image/png")
+        self.set_header("Cache-Control", "private, no-cache")
+        self.finish(image)
@@ -0,0 +1,177 @@
+import base64
+import collections
+import hashlib
+import json
+import threading
+import time
+
+from traitlets.config import Configurable
+from traitlets import Integer
+
+
+class BaseOmniSciRenderer(Configurable):
+    """
+    A class that knows how to render an OmniSci Vega spec to a PNG image.
+
+    Subclasses must implement `render`. A stub implementation can be swapped in
+    through the `OmniSciConfig.omnisci_renderer` trait for testing.
+    """
+
+    def render(self, vega, connection, session):
+        """
+        Render a Vega spec.
+
+        Parameters
+        ----------
+        vega: dict
+            The OmniSci-flavored Vega spec to render.
+
+        connection: dict
+            Connection data for the OmniSci server, as sent in the
+            'application/vnd.omnisci.vega+json' mimebundle.
+
+        session: str
+            A pre-authenticated session id, if available.
+
+        Returns
+        -------
+        image: bytes
+            The raw PNG data.
+        """
+        raise NotImplementedError
+
+
+class OmniSciRenderer(BaseOmniSciRenderer):
+    """
+    A renderer that uses pymapd to ask the OmniSci server to render Vega.
+    """
+
+    compression_level = Integer(
+        default_value=1, help="The PNG compression level to request", config=True
+    )
+
+    def render(self, vega, connection, session):
+        import pymapd
+
+        con = pymapd.connect(
+            user=connection.get("username"),
+            password=connection.get("password"),
+            host=connection.get("host"),
+            port=connection.get("port"),
+            dbname=connection.get("database"),
+            protocol=connection.get("protocol", "binary"),
+            sessionid=session or None,
+        )
+        try:
+            result = con.render_vega(
+                json.dumps(vega), compression_level=self.compression_level
+            )
+        finally:
+            if session:
+                # A shared session must outlive this request,
+                # so only close the socket rather than disconnecting.
+                close_transport(con)
+            else:
+                con.close()
+        return base64.b64decode(result.image_data)
+
+
+def close_transport(con):
+    """
+    Close the socket of a pymapd connection, without disconnecting its session.
+    """
+    try:
+        con._client._iprot.trans.close()
+    except Exception:
+        pass
+
+
+def render_key(vega, connection, session):
+    """
+    Compute a cache key for a render request.
+
+    The Vega spec is normalized by serializing it with sorted keys
+    and compact separators, so that formatting and key order differences
+    in otherwise identical specs map to the same key. The session (or
+    username, if no session is given) and database are included, since
+    the same spec may render differently for different users and databases.
+    """
+    connection = connection or {}
+    identity = {
+        "vega": vega,
+        "session": session or connection.get("username", ""),
+        "host": connection.get("host", ""),
+        "port": str(connection.get("port", "")),
+        "database": connection.get("database", ""),
+    }
+    normalized = json.dumps(identity, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    A size-bounded, least-recently-used cache of rendered images.
+
+    The cache is bounded by the total number of bytes of stored images,
+    evicting the least recently used images first. If `ttl` is set, images
+    older than that many seconds are treated as missing, so that charts
+    pick up changes to the data behind them. It is safe to use from
+    multiple threads, since renders happen off of the event loop.
+
+    `pending` maps keys to the futures of renders in flight, so that
+    concurrent requests for the same image share a single render.
+    """
+
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size = 0
+        self.pending = {}
+        # Mapping from keys to (image, time stored) pairs
+        self._images = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._images)
+
+    def __contains__(self, key):
+        return key in self._images
+
+    def get(self, key):
+        """
+        Get an image by key, marking it as recently used.
+        Returns None if it is not in the cache, or has expired.
+        """
+        with self._lock:
+            entry = self._images.get(key)
+            if entry is None:
+                return None
+            image, stored = entry
+            if self.ttl is not None and time.monotonic() - stored > self.ttl:
+                del self._images[key]
+                self.size -= len(image)
+                return None
+            self._images.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        """
+        Store an image, evicting old images until the cache fits in `max_size`.
+        Images larger than `max_size` are not stored.
+        """
+        if len(image) > self.max_size:
+            return
+        with self._lock:
+            old = self._images.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0])
+            self._images[key] = (image, time.monotonic())
+            self.size += len(image)
+            while self.size > self.max_size:
+                _, (evicted, _) = self._images.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.size = 0
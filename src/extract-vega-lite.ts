@@ -24,12 +24,21 @@ const plugin: JupyterFrontEndPlugin<void> = {
 export default plugin;
 
 const COMM_TARGET = 'extract-vega-lite';
+const BATCH_COMM_TARGET = 'extract-vega-lite-batch';
 
 function commTarget(comm: Kernel.IComm, msg: KernelMessage.ICommOpenMsg) {
   const spec: any = msg.content.data;
   const extractedSpec = extractTransforms(spec, {});
   comm.send(extractedSpec as any);
 }
+function batchCommTarget(
+  comm: Kernel.IComm,
+  msg: KernelMessage.ICommOpenMsg
+) {
+  const specs: any[] = (msg.content.data as any).specs;
+  const extractedSpecs = specs.map(spec => extractTransforms(spec, {}));
+  comm.send({ specs: extractedSpecs } as any);
+}
 function createNew(
   nb: NotebookPanel,
   context: DocumentRegistry.IContext<INotebookModel>
@@ -37,10 +46,12 @@ function createNew(
   context.sessionContext.kernelChanged.connect((_, { newValue, oldValue }) => {
     if (oldValue) {
       oldValue.removeCommTarget(COMM_TARGET, commTarget);
+      oldValue.removeCommTarget(BATCH_COMM_TARGET, batchCommTarget);
     }
 
     if (newValue) {
       newValue.registerCommTarget(COMM_TARGET, commTarget);
+      newValue.registerCommTarget(BATCH_COMM_TARGET, batchCommTarget);
     }
   });
   return new DisposableDelegate(() => {
@@ -1,3 +1,7 @@
+import { URLExt } from '@jupyterlab/coreutils';
+
+import { ServerConnection } from '@jupyterlab/services';
+
 import { JSONObject, PromiseDelegate } from '@lumino/coreutils';
 
 import { Widget } from '@lumino/widgets';
@@ -34,16 +38,44 @@ export class OmniSciVega extends Widget {
       options.sessionId
     );
     this._vega = options.vega;
+    this._connection = options.connection;
+    this._sessionId = options.sessionId;
 
     // _vegaLite is just for debugging, in case we get an error, we can show it.
     this._vegaLite = options.vegaLite;
-    void this._renderData();
+    void this._render();
   }
 
   get renderedImage(): Promise<string> {
     return this._rendered.promise;
   }
 
+  /**
+   * Render the vega, preferring the server-side render cache.
+   *
+   * We only go through the server when we have a pre-authenticated session,
+   * so that credentials are not sent to the notebook server. If that fails
+   * for any reason, fall back to rendering directly from the browser.
+   */
+  private async _render(): Promise<void> {
+    if (this._sessionId) {
+      try {
+        const image = await Private.renderOnServer(
+          this._vega,
+          this._connection,
+          this._sessionId
+        );
+        this._setImageData(image);
+        this._error.textContent = '';
+        this._rendered.resolve(image);
+        return;
+      } catch (error) {
+        console.warn('Server-side rendering failed, rendering directly', error);
+      }
+    }
+    return this._renderData();
+  }
+
   private _renderData(): Promise<void> {
     const vega = this._vega;
     return new Promise<void>((resolve, reject) => {
@@ -104,6 +136,8 @@ export class OmniSciVega extends Widget {
 
   private _rendered = new PromiseDelegate<string>();
   private _vega: JSONObject;
+  private _connection: IOmniSciConnectionData;
+  private _sessionId: string | undefined;
   private _vegaLite: JSONObject | undefined;
   private _connectionPromise: Promise<OmniSciConnection>;
   private _img: HTMLImageElement;
@@ -146,4 +180,88 @@ export namespace OmniSciVega {
  */
 namespace Private {
   export let id = 0;
+
+  /**
+   * Settings for a connection to the notebook server.
+   */
+  const serverSettings = ServerConnection.makeSettings();
+
+  /**
+   * Keys of images rendered on the server, by their render request body.
+   */
+  const keys = new Map<string, string>();
+
+  /**
+   * Render vega through the server extension, which caches rendered images.
+   * Returns a base64 encoded PNG.
+   *
+   * Images already rendered on this page are fetched by key, skipping the
+   * render request unless the server has since evicted or expired them.
+   */
+  export async function renderOnServer(
+    vega: JSONObject,
+    connection: IOmniSciConnectionData,
+    sessionId: string
+  ): Promise<string> {
+    const body = JSON.stringify({ vega, connection, sessionId });
+    let key = keys.get(body);
+    if (key) {
+      const image = await fetchImage(key);
+      if (image !== null) {
+        return image;
+      }
+    }
+    const url = URLExt.join(serverSettings.baseUrl, 'omnisci', 'render');
+    const response = await ServerConnection.makeRequest(
+      url,
+      { method: 'POST', body },
+      serverSettings
+    );
+    if (!response.ok) {
+      throw new ServerConnection.ResponseError(response);
+    }
+    const data = await response.json();
+    key = data.id as string;
+    keys.set(body, key);
+    const image = await fetchImage(key);
+    if (image === null) {
+      throw new Error(`Rendered image ${key} is not in the server cache`);
+    }
+    return image;
+  }
+
+  /**
+   * Fetch a rendered image by key, as a base64 encoded PNG.
+   * Returns null if the server no longer has the image.
+   *
+   * The browser revalidates its cached copy of the image with the server,
+   * so an unchanged image is not downloaded again.
+   */
+  async function fetchImage(key: string): Promise<string | null> {
+    const url = URLExt.join(serverSettings.baseUrl, 'omnisci', 'render', key);
+    const response = await ServerConnection.makeRequest(
+      url,
+      { method: 'GET', cache: 'no-cache' },
+      serverSettings
+    );
+    if (response.status === 404) {
+      return null;
+    }
+    if (!response.ok) {
+      throw new ServerConnection.ResponseError(response);
+    }
+    return blobToBase64(await response.blob());
+  }
+
+  /**
+   * Read a blob as a base64 encoded string.
+   */
+  function blobToBase64(blob: Blob): Promise<string> {
+    return new Promise<string>((resolve, reject) => {
+      const reader = new FileReader();
+      reader.onload = () => resolve((reader.result as string).split(',')[1]);
+      reader.onerror = () => reject(reader.error);
+      reader.readAsDataURL(blob);
+    });
+  }
 }
@@ -0,0 +1,150 @@
+import json
+
+import ibis
+import pandas
+from IPython.display import HTML
+
+from jupyterlab_omnisci import altair as ibis_altair
+from jupyterlab_omnisci.altair import (
+    compile_view,
+    execute_within_budget,
+    load_data,
+    query_connection,
+    render_dashboard,
+    sample_expr,
+    update_spec,
+)
+
+table = ibis.table(
+    [("category", "string"), ("amount", "double"), ("count", "int64")], name="t"
+)
+
+
+def compile_sql(expr):
+    return ibis.omniscidb.compile(expr)
+
+
+def view_transforms():
+    return [
+        {
+            "groupby": ["category"],
+            "aggregate": [{"op": "sum", "field": "amount", "as": "total"}],
+        }
+    ]
+
+
+def test_compile_view():
+    view = {"transform": view_transforms()}
+    query = compile_view(table, view)
+    assert "transform" not in view
+    assert compile_view(table, {"transform": view_transforms()}) is query
+    sql = compile_sql(query.expr)
+    assert 'sum("amount") AS total' in sql
+    assert "GROUP BY" in sql
+
+
+def test_sample_ratio_in_sql():
+    sql = compile_sql(sample_expr(table, 0.1))
+    assert "SAMPLE_RATIO(0.1)" in sql
+
+
+def test_sampled_aggregates_are_scaled():
+    spec = {
+        "transform": [
+            {
+                "groupby": ["category"],
+                "aggregate": [
+                    {"op": "sum", "field": "amount", "as": "total"},
+                    {"op": "count", "as": "n"},
+                ],
+            }
+        ]
+    }
+    expr = update_spec(sample_expr(table, 0.1), spec, approximate=True, scale=10)
+    sql = compile_sql(expr)
+    assert "SAMPLE_RATIO(0.1)" in sql
+    assert "ROUND" not in sql.upper()
+    assert "AS BIGINT" in sql
+
+
+def test_approximate_aggregates():
+    spec = {
+        "transform": [
+            {
+                "groupby": ["category"],
+                "aggregate": [
+                    {"op": "distinct", "field": "amount", "as": "distinct"},
+                    {"op": "median", "field": "amount", "as": "median"},
+                    {"op": "q1", "field": "amount", "as": "q1"},
+                    {"op": "q3", "field": "amount", "as": "q3"},
+                ],
+            }
+        ]
+    }
+    sql = compile_sql(update_spec(table, spec, approximate=True))
+    assert "approx_count_distinct" in sql
+    assert 'APPROX_PERCENTILE("amount", 0.5)' in sql
+    assert 'APPROX_PERCENTILE("amount", 0.25)' in sql
+    assert 'APPROX_PERCENTILE("amount", 0.75)' in sql
+
+
+def test_budget_on_other_backends():
+    df = pandas.DataFrame({"category": ["a", "b", "c"], "amount": [1.0, 2.0, 3.0]})
+    expr = ibis.pandas.connect({"df": df}).table("df")
+    assert query_connection(expr) is None
+    view = {}
+    result = execute_within_budget(
+        expr, view, timeout=10, max_rows=2, on_budget_exceeded="limit"
+    )
+    assert len(result) == 2
+    assert view["usermeta"] == {"truncated": True}
+
+
+class RecordingHandle:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, obj):
+        self.updates.append(obj)
+
+
+class SpecChart:
+    """
+    A chart whose spec is already converted by the `ibis` data transformer.
+    """
+
+    def __init__(self, transform):
+        self.name = f"test_{id(self)}"
+        ibis_altair._name_to_ibis[self.name] = table
+        self.transform = transform
+
+    def to_dict(self):
+        return {"data": {"name": self.name}, "mark": "bar", "transform": self.transform}
+
+
+def test_dashboard_isolates_compile_failures(monkeypatch):
+    handles = []
+
+    def display(obj, display_id):
+        handles.append(RecordingHandle())
+        return handles[-1]
+
+    monkeypatch.setattr(ibis_altair, "display", display)
+    good = SpecChart(view_transforms())
+    bad = SpecChart([{"filter": {"field": "missing", "equal": 1}}])
+    render_dashboard([good, bad], type="json", extract=False)
+    (good_display,) = handles[0].updates
+    assert not isinstance(good_display, HTML)
+    assert "transform" not in good_display.data
+    (bad_display,) = handles[1].updates
+    assert isinstance(bad_display, HTML)
+    assert "missing" in bad_display.data
+
+
+def test_chunked_json(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    df = pandas.DataFrame({"category": list("abcde"), "amount": range(5)})
+    expr = ibis.pandas.connect({"df": df}).table("df")
+    data = load_data(expr, {}, chunked_json=True, chunk_size=2)
+    with open(data["url"]) as f:
+        assert json.load(f) == df.to_dict(orient="records")